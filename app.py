@@ -1,12 +1,17 @@
+from __future__ import annotations
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import timedelta
+from typing import TYPE_CHECKING
 from matplotlib.colors import LinearSegmentedColormap
 from sheets import load_data, upsert_day
 
+if TYPE_CHECKING:
+    import gspread
+
 # ----------------------------
 # Config
 # ----------------------------
@@ -26,6 +31,10 @@ st.set_page_config(page_title="Screen Time Tracker", layout="wide")
 # ----------------------------
 @st.cache_resource
 def get_gspread_client() -> gspread.Client:
+    # Imported here so the first paint doesn't wait on gspread + google-auth
+    import gspread
+    from google.oauth2.service_account import Credentials
+
     if "gcp_service_account" not in st.secrets:
         raise RuntimeError("Missing credentials: add gcp_service_account in Streamlit secrets.")
 
@@ -36,18 +45,21 @@ def get_gspread_client() -> gspread.Client:
 # ----------------------------
 # Helpers (analytics)
 # ----------------------------
-def build_full_range(df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
-    all_days = pd.date_range(start, end, freq="D").date
-    base = pd.DataFrame({"date": all_days})
+@st.cache_data(show_spinner=False)
+def _range_index(start: date, end: date) -> pd.Index:
+    # Only depends on the picked range, so it survives a reload of the sheet data.
+    # Same date32[pyarrow] dtype as load_data's dates so the reindex matches labels directly
+    return pd.Index(pd.date_range(start, end, freq="D").date, dtype="date32[pyarrow]")
 
-    if df.empty:
-        out = base.copy()
-        out["minutes"] = pd.NA
-        return out
 
-    dfr = df[(df["date"] >= start) & (df["date"] <= end)][["date", "minutes"]].copy()
-    out = base.merge(dfr, on="date", how="left")
-    return out
+@st.cache_data(show_spinner=False)
+def build_full_range(df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    all_days = _range_index(start, end)
+    d = df.set_index("date")[["minutes", "weekday"]]
+    # reindex needs unique labels; keep the first row for a repeated day, the one upsert_day writes to
+    d = d[~d.index.duplicated(keep="first")]
+    # weekday comes back NaN on missing days, which every consumer skips anyway
+    return d.reindex(all_days).rename_axis("date").reset_index()
 
 
 def current_streak_under_threshold(daily: pd.DataFrame, threshold: int) -> int:
@@ -58,37 +70,32 @@ def current_streak_under_threshold(daily: pd.DataFrame, threshold: int) -> int:
     if daily.empty:
         return 0
 
-    d = daily.sort_values("date").copy()
-    # Break streak on missing
-    ok = d["minutes"].notna() & (d["minutes"] < threshold)
-
-    streak = 0
-    for v in reversed(ok.tolist()):
-        if v:
-            streak += 1
-        else:
-            break
-    return streak
+    # `daily` comes in sorted by date. Break streak on missing
+    ok = (daily["minutes"].notna() & (daily["minutes"] < threshold)).to_numpy(dtype=bool, na_value=False)
+    rev = ok[::-1]
+    if rev.all():
+        return rev.size
+    # Index of the first break counting back from the latest day
+    return int(np.argmax(~rev))
 
 
+@st.cache_data(show_spinner=False)
 def weekday_heatmap_data(daily: pd.DataFrame) -> pd.DataFrame:
     """
     Returns a 7x1 table (Mon..Sun) with average minutes for the selected range.
     Missing days ignored for averages.
     """
-    d = daily.dropna(subset=["minutes"]).copy()
-    if d.empty:
-        return pd.DataFrame({"avg_minutes": [0]*7}, index=["Mon","Tue","Wed","Thu","Fri","Sat","Sun"])
+    m = daily["minutes"].to_numpy(dtype="float64", na_value=np.nan)
+    valid = ~np.isnan(m)
+    w = daily["weekday"].to_numpy(dtype=np.intp, na_value=0)[valid]  # 0=Mon .. 6=Sun, from load_data
 
-    dt = pd.to_datetime(d["date"])
-    d["weekday"] = dt.dt.day_name()
-    # Order
-    order = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
-    agg = d.groupby("weekday")["minutes"].mean().reindex(order).fillna(0)
+    # Per-weekday sums and counts in one pass each, no string groupby keys
+    sums = np.bincount(w, weights=m[valid], minlength=7)
+    cnts = np.bincount(w, minlength=7)
+    avg = np.divide(sums, cnts, out=np.zeros(7), where=cnts > 0)
 
-    # Prettier index
     idx = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-    return pd.DataFrame({"avg_minutes": agg.values}, index=idx)
+    return pd.DataFrame({"avg_minutes": avg}, index=idx)
 
 
 # ----------------------------
@@ -109,13 +116,17 @@ with left:
     st.subheader("➕ Add / update a day")
 
     day = st.date_input("Date", value=date.today())
-    minutes = st.slider("Screen time minutes", 0, 120, 180, 1)
-    #minutes = st.number_input("Screen time minutes", min_value=0, max_value=2000, value=0, step=5)
+    minutes = st.number_input("Screen time minutes", min_value=0, max_value=2000, value=0, step=5)
 
     if st.button("Save day", type="primary"):
         upsert_day(gc, SHEET_ID, WORKSHEET_NAME, day, int(minutes), source="manual")
+        # upsert_day clears only load_data's cache; the range/heatmap caches stay warm.
+        # Rerun so the fresh sheet is loaded once at the top, not twice in this run
+        st.session_state["saved"] = True
+        st.rerun()
+
+    if st.session_state.pop("saved", False):
         st.success("Saved ✅")
-        df = load_data(gc, SHEET_ID, WORKSHEET_NAME)
 
     st.divider()
     st.subheader("📆 Analysis range")
@@ -151,21 +162,21 @@ with left:
 with right:
     st.subheader("📊 Metrics & charts")
 
-    daily = build_full_range(df, start, end).sort_values("date").copy()
+    # Already in date order; cache_data hands back a fresh copy so it's safe to add columns
+    daily = build_full_range(df, start, end)
 
-    # Missing days highlighting
-    daily["missing"] = daily["minutes"].isna()
-
-    # Metrics (ignore missing for avg, but count missing separately)
-    available = daily.dropna(subset=["minutes"]).copy()
-    avg = available["minutes"].mean() if not available.empty else 0
-    total = available["minutes"].sum() if not available.empty else 0
-    days_total = len(daily)
-    missing_days = int(daily["missing"].sum())
+    # Metrics in one pass over the minutes array (ignore missing for avg, but count missing separately)
+    m = daily["minutes"].to_numpy(dtype="float64", na_value=np.nan)
+    valid = ~np.isnan(m)
+    mv = m[valid]
+    avg = mv.mean() if mv.size else 0
+    total = mv.sum()
+    days_total = m.size
+    missing_days = int((~valid).sum())
 
     # Days above/below goal (only where minutes exist)
-    above = int((available["minutes"] > goal).sum()) if not available.empty else 0
-    below = int((available["minutes"] <= goal).sum()) if not available.empty else 0
+    above = int((mv > goal).sum())
+    below = int((mv <= goal).sum())
 
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Avg (min/day)", f"{avg:.1f}")
@@ -179,7 +190,11 @@ with right:
 
     st.write("")
     # Line chart: fill missing as 0 for charting, but keep missing flag for table
-    chart_series = daily.set_index("date")["minutes"].fillna(0)
+    chart_series = pd.Series(
+        np.nan_to_num(m, nan=0.0),
+        index=pd.Index(daily["date"].to_numpy(), name="date"),
+        name="minutes",
+    )
     st.line_chart(chart_series)
 
     st.divider()
@@ -204,17 +219,18 @@ with right:
         st.subheader("🗂️ Data (missing days)")
 
         display = daily.copy()
-        display["date"] = pd.to_datetime(display["date"]).dt.strftime("%Y-%m-%d")
-        display["minutes"] = display["minutes"].astype("Int64")
+        display["missing"] = ~valid
 
-        def highlight_missing(row):
-            return ["background-color: #2a2a2a" if row["missing"] else "" for _ in row]
+        def highlight_missing(frame):
+            # Whole-frame CSS in one np.where instead of a Python callback per row
+            css = np.where(frame["missing"].to_numpy(dtype=bool)[:, None], "background-color: #2a2a2a", "")
+            return pd.DataFrame(np.broadcast_to(css, frame.shape), index=frame.index, columns=frame.columns)
 
         only_missing = display[display['missing'] == True ]
         
         st.dataframe(
             only_missing[["date", "minutes", "missing"]]
-                .style.apply(highlight_missing, axis=1),
+                .style.apply(highlight_missing, axis=None),
             use_container_width=True
         )
 
@@ -1,29 +1,108 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import List
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
-import gspread
+import streamlit as st
 
+if TYPE_CHECKING:
+    import gspread
 
-def load_data(gc: gspread.Client, sheet_id: str, worksheet_name: str) -> pd.DataFrame:
-    sh = gc.open_by_key(sheet_id)
-    ws = sh.worksheet(worksheet_name)
-    records = ws.get_all_records()
 
-    if not records:
-        return pd.DataFrame(columns=["date", "minutes", "source", "updated_at"])
+@st.cache_resource
+def _ws(_gc: gspread.Client, sheet_id: str, worksheet_name: str) -> gspread.Worksheet:
+    # open_by_key + worksheet are metadata calls; the handle itself doesn't go stale
+    return _gc.open_by_key(sheet_id).worksheet(worksheet_name)
 
-    df = pd.DataFrame(records)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_data(_gc: gspread.Client, sheet_id: str, worksheet_name: str) -> pd.DataFrame:
+    from gspread.utils import absolute_range_name
+
+    # `_gc` is skipped by Streamlit's hasher, so the cache is keyed on (sheet_id, worksheet_name)
+    ws = _ws(_gc, sheet_id, worksheet_name)
+    # One values call for the whole A:D block instead of get_all_records' metadata + values round trips
+    resp = ws.spreadsheet.values_batch_get([absolute_range_name(worksheet_name, "A:D")])
+    values = resp["valueRanges"][0].get("values", [])
+
+    if len(values) < 2:
+        return pd.DataFrame(columns=["date", "minutes", "source", "updated_at", "row", "weekday"])
+
+    header, rows = values[0], values[1:]
+    # The API trims trailing empty cells, so fit ragged rows to the header width
+    width = len(header)
+    rows = [(r + [""] * width)[:width] for r in rows]
+    df = pd.DataFrame(rows, columns=header)
+    # 1-indexed sheet row (header is row 1), recorded before rows get dropped or reordered
+    df["row"] = range(2, len(rows) + 2)
     df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
-    df["minutes"] = pd.to_numeric(df["minutes"], errors="coerce").fillna(0).astype(int)
+    # Nullable int16: blank/garbled/out-of-range cells stay <NA> instead of turning into 0 minutes
+    minutes = pd.to_numeric(df["minutes"], errors="coerce").round()
+    df["minutes"] = minutes.where(minutes.between(0, np.iinfo(np.int16).max)).astype("Int16")
     df["source"] = df.get("source", "manual")
     df["updated_at"] = df.get("updated_at", "")
-    df = df.dropna(subset=["date"]).sort_values("date")
+    df = df.dropna(subset=["date"]).sort_values("date", kind="stable")
+    # Derived once per load so reruns don't re-parse dates for the heatmap (0=Mon .. 6=Sun)
+    df["weekday"] = pd.to_datetime(df["date"]).dt.weekday.astype("int8")
+
+    # Arrow-backed columns hand off to st.dataframe's Arrow serializer without a conversion pass
+    df = df.convert_dtypes(dtype_backend="pyarrow")
+    df["date"] = df["date"].astype("date32[pyarrow]")
+    df["minutes"] = df["minutes"].astype("int16[pyarrow]")
     return df
 
 
+def upsert_days(
+    gc: gspread.Client,
+    sheet_id: str,
+    worksheet_name: str,
+    rows: List[Tuple[date, int, str]],
+) -> List[str]:
+    """
+    Upserts several (day, minutes, source) rows with at most two HTTP calls:
+    one batch_update for days already in the sheet and one append_rows for new
+    ones. Returns "updated"/"inserted" per input row, in order.
+
+    Sheet rows are looked up in the cached load_data frame, which is cleared
+    after writing so the data and its row numbers are always reloaded together.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    ws = _ws(gc, sheet_id, worksheet_name)
+
+    df = load_data(gc, sheet_id, worksheet_name)
+    # First match wins, same row the old col_values(1).index(day_str) lookup picked
+    first = df.drop_duplicates("date", keep="first")
+    row_index: Dict[date, int] = dict(zip(first["date"], first["row"]))
+    now_str = datetime.utcnow().isoformat()
+
+    updates: List[dict] = []
+    new_rows: Dict[str, List] = {}  # day_str -> row; a repeated new day is appended once
+    statuses: List[str] = []
+
+    for day, minutes, source in rows:
+        day_str = day.isoformat()
+        row_idx = row_index.get(day)
+        if row_idx is not None:
+            rng = f"{rowcol_to_a1(row_idx, 2)}:{rowcol_to_a1(row_idx, 4)}"  # B:D
+            updates.append({"range": rng, "values": [[minutes, source, now_str]]})
+            statuses.append("updated")
+        else:
+            new_rows[day_str] = [day_str, minutes, source, now_str]
+            statuses.append("inserted")
+
+    if updates:
+        ws.batch_update(updates)
+
+    if new_rows:
+        ws.append_rows(list(new_rows.values()), value_input_option="RAW")
+
+    load_data.clear()
+    return statuses
+
+
 def upsert_day(
     gc: gspread.Client,
     sheet_id: str,
@@ -32,17 +111,4 @@ def upsert_day(
     minutes: int,
     source: str = "manual",
 ) -> str:
-    sh = gc.open_by_key(sheet_id)
-    ws = sh.worksheet(worksheet_name)
-
-    col_dates: List[str] = ws.col_values(1)  # includes header
-    day_str = day.isoformat()
-    now_str = datetime.utcnow().isoformat()
-
-    if day_str in col_dates[1:]:
-        row_idx = col_dates.index(day_str) + 1  # 1-indexed row number in sheet
-        ws.update(f"B{row_idx}:D{row_idx}", [[minutes, source, now_str]])
-        return "updated"
-    else:
-        ws.append_row([day_str, minutes, source, now_str])
-        return "inserted"
+    return upsert_days(gc, sheet_id, worksheet_name, [(day, minutes, source)])[0]